@@ -2,6 +2,82 @@
 # Copyright (c) 2024 Enrico Altavilla
 # Licensed under the MIT License (see LICENSE for details)
 
+from collections import namedtuple
+
+# Integer codes for the condition types, used by the compiled conditions.
+_REQUIRE_IF_LABEL = 0
+_SKIP_IF_LABEL = 1
+_REQUIRE_IF_PRESENT = 2
+
+_CONDITION_KINDS = {
+    "require_if_label": _REQUIRE_IF_LABEL,
+    "skip_if_label": _SKIP_IF_LABEL,
+    "require_if_present": _REQUIRE_IF_PRESENT,
+}
+
+
+# A condition compiled for fast validation. Required and skipped steps are bitmasks with
+# bit i standing for step i; label_bit is set in the label bits of the callable objects
+# whose labels satisfy the condition.
+_Condition = namedtuple(
+    "_Condition", ["kind", "target_index", "label_items", "label_bit", "required_mask", "skip_mask"]
+)
+
+
+# Sentinel for labels missing from a callable object, distinct from any label value.
+_MISSING = object()
+
+
+def _labels_match(label_items, labels):
+    """
+    Check whether a labels dictionary contains all the (key, value) pairs in label_items.
+
+    Values are compared by identity first, then equality, like dict items containment does,
+    so the same object always matches itself (even NaN, whose __eq__ isn't reflexive).
+    """
+    if len(label_items) == 1:
+        # The common case: a single label, matched with a single lookup.
+        ((key, value),) = label_items
+        label_value = labels.get(key, _MISSING)
+        return label_value is value or label_value == value
+
+    for key, value in label_items:
+        label_value = labels.get(key, _MISSING)
+        if not (label_value is value or label_value == value):
+            return False
+    return True
+
+
+def _build_validator(conditions):
+    """
+    Generate a function validator(present_mask, label_mask) that checks the given compiled
+    conditions, in order, with one hardcoded test per condition and all the bitmasks inlined
+    as constants, instead of interpreting the list of conditions on every call.
+
+    Only integers are written into the generated source, never user-provided values.
+    """
+    lines = ["def validator(present_mask, label_mask):"]
+
+    for kind, target_index, _, label_bit, required_mask, skip_mask in conditions:
+        if kind == _REQUIRE_IF_PRESENT:
+            trigger = f"present_mask & {1 << target_index}"
+        else:
+            trigger = f"label_mask & {label_bit}"
+
+        if required_mask:
+            lines.append(f"    if {trigger} and (present_mask & {required_mask}) != {required_mask}:")
+            lines.append("        return False")
+        if skip_mask:
+            lines.append(f"    if {trigger} and present_mask & {skip_mask}:")
+            lines.append("        return False")
+
+    lines.append("    return True")
+
+    namespace = {}
+    exec(compile("\n".join(lines), "<pipesmith>", "exec"), namespace)
+    return namespace["validator"]
+
+
 class pipesmith:
     __version__ = "1.1.0"
 
@@ -25,101 +101,235 @@ class pipesmith:
         """
         self.steps = steps
         self.conditions = conditions or []
-        self._validate_steps()
-        self._validate_conditions()
+        self._normalized_steps, self._compiled_conditions, self.step_index_map = self._compile(
+            steps, self.conditions
+        )
+
+        # Conditions grouped by the deepest step they look at, so a partial combination can
+        # be rejected as soon as every step a condition depends on has been chosen.
+        self._conditions_by_max_depth = [[] for _ in steps]
+        for condition in self._compiled_conditions:
+            max_depth = max(
+                condition.target_index, (condition.required_mask | condition.skip_mask).bit_length() - 1
+            )
+            self._conditions_by_max_depth[max_depth].append(condition)
+
+        # Within a depth, evaluate require_if_present conditions first: they only need the
+        # presence mask, so a rejected prefix is usually detected by the cheapest test.
+        for conditions in self._conditions_by_max_depth:
+            conditions.sort(key=lambda condition: condition.kind != _REQUIRE_IF_PRESENT)
+
+        # Specialized validators for the fixed set of conditions: one for whole combinations,
+        # and one per depth (None where no condition can be decided).
+        self._validator = _build_validator(self._compiled_conditions)
+        self._validators_by_depth = [
+            _build_validator(conditions) if conditions else None for conditions in self._conditions_by_max_depth
+        ]
+
+        # Bits of the presence and label masks that the conditions decided at depth d or deeper
+        # may read. Prefix masks are reduced to these bits, so that prefixes differing only in
+        # bits no later condition looks at lead to the same subtree.
+        self._relevant_masks = [(0, 0)] * (len(steps) + 1)
+        present_bits = label_bits = 0
+        for depth in reversed(range(len(steps))):
+            for condition in self._conditions_by_max_depth[depth]:
+                present_bits |= condition.required_mask | condition.skip_mask
+                if condition.kind == _REQUIRE_IF_PRESENT:
+                    present_bits |= 1 << condition.target_index
+                else:
+                    label_bits |= condition.label_bit
+            self._relevant_masks[depth] = (present_bits, label_bits)
 
-        self.step_index_map = {label: index for index, (label, _) in enumerate(steps)}
+        self._encoded_steps, self._step_classes = self._encode_steps()
 
+        # Valid continuations of a prefix, memoized per (depth, present_mask, label_mask)
+        # (see _expand).
+        self._subtrees = {}
 
+        # The steps and conditions are fixed once compiled, so the valid combinations are
+        # computed at most once (see generate_combinations).
+        self._cached_combinations = None
 
-    def _validate_steps(self):
-        errors = []
 
-        def validate_step(step):
-            if not isinstance(step, tuple) or len(step) != 2:
-                errors.append(f"Invalid step format: {step}. Expected a tuple with two elements.")
-                return
 
-            label, items = step
+    def _compile(self, steps, conditions):
+        """
+        Validate the steps and the conditions, and compile them into the structures used to
+        generate combinations, in a single pass over each. Validation is skipped when Python
+        runs with optimizations enabled (-O).
 
-            if not isinstance(label, str):
-                errors.append(f"Invalid step label: {label}. Expected a string.")
+        Each condition gets its own bit (label_bit), set in the label bits of the callable
+        objects whose labels satisfy that condition.
 
-            if not isinstance(items, list):
-                errors.append(f"Invalid step items: {items}. Expected a list.")
+        Returns:
+        - normalized_steps: A tuple with, for each step, a tuple of (callable object, labels) pairs.
+        - compiled_conditions: A list of _Condition tuples.
+        - index_map: A dictionary mapping each step label to its index.
+        """
+        errors = []
+        normalized_steps = []
+        step_labels = []
+        index_map = {}
 
-            for item in items:
-                validate_item(item)
+        for index, step in enumerate(steps):
+            if __debug__:
+                if not isinstance(step, tuple) or len(step) != 2:
+                    errors.append(f"Invalid step format: {step}. Expected a tuple with two elements.")
+                    continue
 
-        def validate_item(item):
-            if item is None:
-                return
+            label, items = step
 
-            if callable(item):
-                return
+            if __debug__:
+                if not isinstance(label, str):
+                    errors.append(f"Invalid step label: {label}. Expected a string.")
 
-            if isinstance(item, tuple):
-                if len(item) != 2:
-                    errors.append(f"Invalid item tuple length: {item}. Expected exactly two elements.")
-                    return
+                if not isinstance(items, list):
+                    errors.append(f"Invalid step items: {items}. Expected a list.")
+                    continue
 
-                func_or_instance, labels = item
-                if not callable(func_or_instance) and not isinstance(func_or_instance, object):
-                    errors.append(f"Invalid function or instance in tuple: {func_or_instance}. Expected a callable or an object instance.")
-                if not isinstance(labels, dict):
-                    errors.append(f"Invalid labels in tuple: {labels}. Expected a dictionary.")
-            elif not isinstance(item, object):
-                errors.append(f"Invalid item: {item}. Expected a callable, an object instance, tuple, or None.")
+            # Items are normalized into (callable object, labels) pairs, so enumeration doesn't
+            # have to tell plain callables and labelled tuples apart.
+            normalized_items = []
+            for item in items:
+                if isinstance(item, tuple) and len(item) == 2:
+                    if __debug__:
+                        if not isinstance(item[1], dict):
+                            errors.append(f"Invalid labels in tuple: {item[1]}. Expected a dictionary.")
+                    normalized_items.append(item)
+                else:
+                    if __debug__:
+                        if isinstance(item, tuple):
+                            errors.append(f"Invalid item tuple length: {item}. Expected exactly two elements.")
+                    normalized_items.append((item, {}))
 
-        for step in self.steps:
-            validate_step(step)
+            normalized_steps.append(tuple(normalized_items))
+            step_labels.append(label)
+            index_map[label] = index
 
         if errors:
             raise ValueError(f"Step validation failed with errors: {errors}")
 
+        compiled_conditions = []
+
+        for condition_index, condition in enumerate(conditions):
+            if __debug__:
+                error_count = len(errors)
+
+                if not isinstance(condition, dict):
+                    errors.append(f"Invalid condition format: {condition}. Expected a dictionary.")
+                    continue
+
+                condition_type = condition.get("condition")
+                if not condition_type or condition_type not in _CONDITION_KINDS:
+                    errors.append(f"Invalid or missing condition type: {condition_type}.")
+                    continue
+
+                target_step = condition.get("target_step")
+                if not target_step or not isinstance(target_step, str) or target_step not in step_labels:
+                    errors.append(f"Invalid or missing target step: {target_step}. Must be one of {step_labels}.")
+                    continue
+
+                if condition_type == "require_if_label" or condition_type == "skip_if_label":
+                    label = condition.get("label")
+                    if not label or not isinstance(label, dict):
+                        errors.append(f"Invalid or missing label: {label}. Expected a dictionary.")
+
+                if condition_type == "require_if_label" or condition_type == "require_if_present":
+                    required_steps = condition.get("required_steps", [])
+                    if not isinstance(required_steps, list) or not all(step in step_labels for step in required_steps):
+                        errors.append(f"Invalid required steps: {required_steps}. Must be a list of valid step labels.")
+
+                if condition_type == "skip_if_label":
+                    skip_steps = condition.get("skip_steps", [])
+                    if not isinstance(skip_steps, list) or not all(step in step_labels for step in skip_steps):
+                        errors.append(f"Invalid skip steps: {skip_steps}. Must be a list of valid step labels.")
+
+                if len(errors) > error_count:
+                    continue
+
+            kind = _CONDITION_KINDS[condition["condition"]]
+            required_mask = 0
+            skip_mask = 0
+            if kind == _SKIP_IF_LABEL:
+                for step in condition.get("skip_steps", []):
+                    skip_mask |= 1 << index_map[step]
+            else:
+                for step in condition.get("required_steps", []):
+                    required_mask |= 1 << index_map[step]
+
+            compiled_conditions.append(_Condition(
+                kind=kind,
+                target_index=index_map[condition["target_step"]],
+                label_items=tuple((condition.get("label") or {}).items()),
+                label_bit=1 << condition_index,
+                required_mask=required_mask,
+                skip_mask=skip_mask,
+            ))
 
+        if errors:
+            raise ValueError(f"Condition validation failed with errors: {errors}")
 
-    def _validate_conditions(self):
-        errors = []
-
-        valid_condition_types = {"require_if_label", "skip_if_label", "require_if_present"}
-        step_labels = [label for label, _ in self.steps]
+        return tuple(normalized_steps), compiled_conditions, index_map
 
-        def validate_condition(condition):
-            if not isinstance(condition, dict):
-                errors.append(f"Invalid condition format: {condition}. Expected a dictionary.")
-                return
 
-            condition_type = condition.get("condition")
-            if not condition_type or condition_type not in valid_condition_types:
-                errors.append(f"Invalid or missing condition type: {condition_type}.")
-                return
 
-            target_step = condition.get("target_step")
-            if not target_step or not isinstance(target_step, str) or target_step not in step_labels:
-                errors.append(f"Invalid or missing target step: {target_step}. Must be one of {step_labels}.")
-                return
+    def _encode_steps(self):
+        """
+        Precompute, for every callable object, its presence bit (bit i for step i, or 0 for None)
+        and the bits of the label conditions it triggers, so that enumeration combines integers
+        instead of checking for None and matching labels dictionaries.
 
-            if condition_type == "require_if_label" or condition_type == "skip_if_label":
-                label = condition.get("label")
-                if not label or not isinstance(label, dict):
-                    errors.append(f"Invalid or missing label: {label}. Expected a dictionary.")
+        Labels dictionaries are interned per step into integer ids, and the label conditions
+        are matched once per distinct dictionary: within a step, label_match[label_id] holds
+        the bits of the conditions satisfied by that dictionary.
 
-            if condition_type == "require_if_label":
-                required_steps = condition.get("required_steps", [])
-                if not isinstance(required_steps, list) or not all(step in step_labels for step in required_steps):
-                    errors.append(f"Invalid required steps: {required_steps}. Must be a list of valid step labels.")
+        The callable objects of a step are then grouped into classes with the same (presence bit,
+        label bits): the conditions can't tell them apart, so they are evaluated once per class.
 
-            if condition_type == "skip_if_label":
-                skip_steps = condition.get("skip_steps", [])
-                if not isinstance(skip_steps, list) or not all(step in step_labels for step in skip_steps):
-                    errors.append(f"Invalid skip steps: {skip_steps}. Must be a list of valid step labels.")
+        Returns:
+        - encoded_steps: A tuple with, for each step, a tuple of (callable object, class index) pairs.
+        - step_classes: A tuple with, for each step, a tuple of (presence bit, label bits) classes.
+        """
+        label_conditions = [[] for _ in self.steps]
+        for condition in self._compiled_conditions:
+            if condition.kind != _REQUIRE_IF_PRESENT:
+                label_conditions[condition.target_index].append((condition.label_items, condition.label_bit))
+
+        encoded_steps = []
+        step_classes = []
+        for step_index, items in enumerate(self._normalized_steps):
+            label_ids = {}
+            label_match = []
+            class_ids = {}
+            encoded_items = []
+            for callable_obj, labels in items:
+                try:
+                    key = frozenset(labels.items())
+                except TypeError:
+                    # Unhashable label values: intern the dictionary by identity instead.
+                    key = id(labels)
+
+                label_id = label_ids.get(key)
+                if label_id is None:
+                    label_id = label_ids[key] = len(label_match)
+                    label_bits = 0
+                    for label_items, label_bit in label_conditions[step_index]:
+                        if _labels_match(label_items, labels):
+                            label_bits |= label_bit
+                    label_match.append(label_bits)
+
+                # Label conditions only apply if the target callable carries all the labels.
+                item_class = (
+                    0 if callable_obj is None else 1 << step_index,
+                    label_match[label_id] if callable_obj else 0,
+                )
+                class_index = class_ids.setdefault(item_class, len(class_ids))
+                encoded_items.append((callable_obj, class_index))
 
-        for condition in self.conditions:
-            validate_condition(condition)
+            encoded_steps.append(tuple(encoded_items))
+            step_classes.append(tuple(class_ids))
 
-        if errors:
-            raise ValueError(f"Condition validation failed with errors: {errors}")
+        return tuple(encoded_steps), tuple(step_classes)
 
 
 
@@ -149,39 +359,18 @@ class pipesmith:
         Returns:
         - True if the combination meets all the conditions, False otherwise.
         """
-        for condition in self.conditions:
-            if condition["condition"] == "require_if_label":
-                # Ensure required steps are present if a specific label is found.
-                target_index = self.get_step_index(condition["target_step"])
-                target_callable = current_combination[target_index]
-                target_labels = combination_labels[target_index]
-                if target_callable and condition["label"].items() <= target_labels.items():
-                    for step in condition["required_steps"]:
-                        required_index = self.get_step_index(step)
-                        if current_combination[required_index] is None:
-                            return False
-
-            elif condition["condition"] == "skip_if_label":
-                # Skip certain steps if a specific label is found.
-                target_index = self.get_step_index(condition["target_step"])
-                target_callable = current_combination[target_index]
-                target_labels = combination_labels[target_index]
-                if target_callable and condition["label"].items() <= target_labels.items():
-                    for step in condition["skip_steps"]:
-                        skip_index = self.get_step_index(step)
-                        if current_combination[skip_index] is not None:
-                            return False
-
-            elif condition["condition"] == "require_if_present":
-                # Ensure certain steps are present if another step is present.
-                target_index = self.get_step_index(condition["target_step"])
-                if current_combination[target_index] is not None:
-                    for step in condition["required_steps"]:
-                        required_index = self.get_step_index(step)
-                        if current_combination[required_index] is None:
-                            return False
-
-        return True
+        present_mask = 0
+        for index, callable_obj in enumerate(current_combination):
+            if callable_obj is not None:
+                present_mask |= 1 << index
+
+        label_mask = 0
+        for kind, target_index, label_items, label_bit, _, _ in self._compiled_conditions:
+            if kind != _REQUIRE_IF_PRESENT and current_combination[target_index] \
+                    and _labels_match(label_items, combination_labels[target_index]):
+                label_mask |= label_bit
+
+        return self._validator(present_mask, label_mask)
 
 
 
@@ -192,36 +381,134 @@ class pipesmith:
         Returns:
         - A list of tuples, each tuple representing a valid combination of callable objects.
         """
-        combinations = []
-
-        def recursive_generate(current_combination, current_labels, depth):
-            """
-            Recursive helper function to generate combinations.
-
-            Parameters:
-            - current_combination: The current list of callable objects being combined.
-            - current_labels: The current list of labels associated with the callable objects.
-            - depth: The current depth of recursion, representing the step being processed.
-            """
-            if depth == len(self.steps):
-                if self.is_valid_combination(current_combination, current_labels):
-                    combinations.append(tuple(current_combination))
-                return
-            
-            _, callables_with_labels = self.steps[depth]
-
-            for item in callables_with_labels:
-                if isinstance(item, tuple) and len(item) == 2:
-                    callable_obj, labels = item
-                else:
-                    callable_obj = item
-                    labels = {}
-                
-                recursive_generate(
-                    current_combination + [callable_obj],
-                    current_labels + [labels],
-                    depth + 1
-                )
+        if self._cached_combinations is None:
+            self._cached_combinations = list(self.iter_combinations())
+
+        # A new list on every call, so callers can't alter the cached combinations.
+        return list(self._cached_combinations)
+
+
+
+    def iter_combinations(self):
+        """
+        Iterate over the valid combinations of the steps, in the same order as generate_combinations,
+        without building the whole list in memory.
+
+        Yields:
+        - Tuples, each tuple representing a valid combination of callable objects.
+        """
+        if self._cached_combinations is not None:
+            yield from self._cached_combinations
+            return
+
+        num_steps = len(self._encoded_steps)
+        subtrees = self._subtrees
+
+        if not num_steps:
+            yield ()
+            return
+
+        last_depth = num_steps - 1
+        root = self._expand(0, 0, 0)
+
+        if not last_depth:
+            for callable_obj, _, _ in root:
+                yield (callable_obj,)
+            return
+
+        # Depth-first walk over the memoized subtrees: every choice they hold leads to at least
+        # one valid combination, so the walk never backtracks out of a dead end. prefixes[d]
+        # holds the first d choices as an immutable tuple, shared by every combination below it.
+        # The choices of the last step are emitted in a tight inner loop, one concatenation each.
+        prefixes = [()] * last_depth
+        iterators = [None] * last_depth
+        iterators[0] = iter(root)
+        depth = 0
+
+        while depth >= 0:
+            # Choices are never None, so None marks an exhausted step.
+            choice = next(iterators[depth], None)
+            if choice is None:
+                depth -= 1
+                continue
+
+            callable_obj, present_mask, label_mask = choice
+            prefix = prefixes[depth] + (callable_obj,)
+            children = subtrees[depth + 1, present_mask, label_mask]
+
+            if depth + 1 == last_depth:
+                for child_callable, _, _ in children:
+                    yield prefix + (child_callable,)
+            else:
+                depth += 1
+                prefixes[depth] = prefix
+                iterators[depth] = iter(children)
+
+
+
+    def _expand(self, depth, present_mask, label_mask):
+        """
+        Find the choices at a given depth that lead to at least one valid combination.
 
-        recursive_generate([], [], 0)
-        return combinations
+        Subtrees are memoized per (depth, present_mask, label_mask): the conditions only look
+        at the presence and label bits of a prefix, so prefixes with the same (reduced) masks
+        have the same valid continuations, and each of them is explored only once.
+
+        Parameters:
+        - depth: The index of the step to choose from.
+        - present_mask: The presence bits of the prefix, reduced to the relevant ones.
+        - label_mask: The label bits of the prefix, reduced to the relevant ones.
+
+        Returns:
+        - A tuple of (callable object, present_mask, label_mask) choices, where the masks are
+          those of the prefix extended with the callable object.
+        """
+        # Bound once per call rather than looked up on self for every item.
+        subtrees = self._subtrees
+        expand = self._expand
+
+        key = (depth, present_mask, label_mask)
+        choices = subtrees.get(key)
+        if choices is not None:
+            return choices
+
+        validator = self._validators_by_depth[depth]
+        relevant_present, relevant_label = self._relevant_masks[depth + 1]
+        child_depth = depth + 1
+        is_last = child_depth == len(self._encoded_steps)
+
+        # Evaluate the conditions once per class of equivalent callable objects, rather than
+        # once per callable object: class_children[c] holds the masks of the prefix extended
+        # with class c, or None if no valid combination follows.
+        class_children = []
+        for present_bit, label_bits in self._step_classes[depth]:
+            child_present = present_mask | present_bit
+            child_label = label_mask | label_bits
+
+            # Prune the whole subtree if the conditions decided at this depth don't hold.
+            if validator is not None and not validator(child_present, child_label):
+                class_children.append(None)
+                continue
+
+            child_present &= relevant_present
+            child_label &= relevant_label
+            if not is_last:
+                # Look the child subtree up directly; only unseen states need a call.
+                child_choices = subtrees.get((child_depth, child_present, child_label))
+                if child_choices is None:
+                    child_choices = expand(child_depth, child_present, child_label)
+                if not child_choices:
+                    class_children.append(None)
+                    continue
+
+            class_children.append((child_present, child_label))
+
+        # Then spread the outcome over the callable objects, in their original order.
+        choices = []
+        for callable_obj, class_index in self._encoded_steps[depth]:
+            child = class_children[class_index]
+            if child is not None:
+                choices.append((callable_obj, child[0], child[1]))
+
+        choices = subtrees[key] = tuple(choices)
+        return choices